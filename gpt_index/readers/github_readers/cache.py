@@ -0,0 +1,114 @@
+"""
+Github readers cache.
+
+This module contains the on-disk cache used by the Github readers
+to store git objects and API responses between loads.
+"""
+import os
+from typing import List, Optional, Sequence, Tuple
+
+
+class FileCache:
+    """
+    On-disk cache of files, grouped in namespaces.
+
+    Each entry is stored in `{cache_dir}/{namespace}/{key[:2]}/{key}` and
+    written atomically, so a concurrent reader never sees it partly written.
+
+    If `max_size` is set, the least recently used entries are evicted
+    once the entries exceed it (reading an entry marks it as used).
+    Otherwise the cache directory is never pruned.
+
+    Examples:
+        >>> cache = FileCache("~/.cache/gpt_index/github", ["blobs"])
+        >>> cache.write("blobs", "blob_sha", b"content")
+        >>> cache.read("blobs", "blob_sha")
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        namespaces: Sequence[str],
+        max_size: Optional[int] = None,
+    ):
+        """
+        Initialize params.
+
+        Args:
+            - cache_dir (str): Directory to store the entries in.
+            - namespaces (Sequence[str]): Namespaces of the entries,
+                only these count towards `max_size`.
+            - max_size (int): Maximum size (in bytes) of the entries,
+                unbounded if not provided.
+        """
+        self._cache_dir = os.path.expanduser(cache_dir)
+        self._namespaces = namespaces
+        self._max_size = max_size
+        # total size of the entries, computed on the first write
+        self._size: Optional[int] = None
+
+    def _get_path(self, namespace: str, key: str) -> str:
+        """Get the path of an entry (fanned out by the key prefix)."""
+        return os.path.join(self._cache_dir, namespace, key[:2], key)
+
+    def read(self, namespace: str, key: str) -> Optional[bytes]:
+        """Read an entry, return None on a cache miss."""
+        path = self._get_path(namespace, key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        if self._max_size is not None:
+            # the modification time orders the entries for eviction
+            os.utime(path)
+        return content
+
+    def write(self, namespace: str, key: str, content: bytes) -> None:
+        """Write an entry atomically, evicting others if the cache is full."""
+        path = self._get_path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        if self._max_size is not None:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._list_entries())
+            else:
+                self._size += len(content)
+            if self._size > self._max_size:
+                self._evict()
+
+    def _list_entries(self) -> List[Tuple[float, int, str]]:
+        """List the (modification time, size, path) of the entries."""
+        entries = []
+        for namespace in self._namespaces:
+            for dir_path, _, file_names in os.walk(
+                os.path.join(self._cache_dir, namespace)
+            ):
+                for file_name in file_names:
+                    if file_name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(dir_path, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache fits max_size."""
+        assert self._max_size is not None
+        entries = sorted(self._list_entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
@@ -5,12 +5,19 @@ This module contains the Github API client for the GPT-Index library.
 It is used by the Github readers to retrieve the data from Github.
 """
 
+import asyncio
+import hashlib
 import os
+import random
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote
 
 from dataclasses_json import DataClassJsonMixin
 
+from gpt_index.readers.github_readers.cache import FileCache
+
 
 @dataclass
 class GitTreeResponseModel(DataClassJsonMixin):
@@ -83,7 +90,8 @@ class GitCommitResponseModel(DataClassJsonMixin):
     Dataclass for the response from the Github API's getCommit endpoint.
 
     Attributes:
-        - tree (Tree): Tree object for the commit.
+        - sha (str): SHA of the commit.
+        - commit (Commit): Commit object, with the tree of the commit.
     """
 
     @dataclass
@@ -103,6 +111,7 @@ class GitCommitResponseModel(DataClassJsonMixin):
 
         tree: Tree
 
+    sha: str
     commit: Commit
 
 
@@ -117,7 +126,12 @@ class GitBranchResponseModel(DataClassJsonMixin):
 
     @dataclass
     class Commit(DataClassJsonMixin):
-        """Dataclass for the commit object in the branch. (commit.commit)."""
+        """
+        Dataclass for the commit object in the branch. (commit.commit).
+
+        Attributes:
+            - sha (str): SHA of the commit the branch points to.
+        """
 
         @dataclass
         class Commit(DataClassJsonMixin):
@@ -135,11 +149,54 @@ class GitBranchResponseModel(DataClassJsonMixin):
 
             tree: Tree
 
+        sha: str
         commit: Commit
 
     commit: Commit
 
 
+class ETagCache:
+    """
+    On-disk cache of responses and their ETag.
+
+    Used to make conditional requests (If-None-Match): Github answers with
+    "304 Not Modified" if the response did not change, which does not
+    count against the rate limit, and the cached content is used instead.
+
+    Examples:
+        >>> cache = ETagCache("~/.cache/gpt_index/github/responses")
+        >>> cache.set("url", "etag", b"content")
+        >>> etag, content = cache.get("url")
+    """
+
+    def __init__(self, cache_dir: str):
+        """
+        Initialize params.
+
+        Args:
+            - cache_dir (str): Directory to store the responses in.
+        """
+        self._files = FileCache(cache_dir, ["etags"])
+
+    def _get_key(self, key: str) -> str:
+        """Hash a key (i.e. a URL) into a file name."""
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        """Get the ETag and content of a response, None if it is not cached."""
+        cached = self._files.read("etags", self._get_key(key))
+        if cached is None:
+            return None
+        etag, _, content = cached.partition(b"\n")
+        return etag.decode("utf-8"), content
+
+    def set(self, key: str, etag: str, content: bytes) -> None:
+        """Cache the ETag and content of a response."""
+        self._files.write(
+            "etags", self._get_key(key), etag.encode("utf-8") + b"\n" + content
+        )
+
+
 class GithubClient:
     """
     An asynchronous client for interacting with the Github API.
@@ -150,12 +207,23 @@ class GithubClient:
     which can be passed as an argument or set as an environment variable.
     If no Github token is provided, the client will raise a ValueError.
 
+    All the requests share a single HTTP connection pool, so that connections
+    (and their TLS sessions) are kept alive and reused between requests.
+    Call `aclose` (or use the client as an async context manager)
+    to close the connections once done.
+
+    The number of requests in flight is bounded, and the rate limit headers
+    of the responses are honoured: when the rate limit is exhausted,
+    the following requests wait for it to reset, and requests that were
+    rate limited (403/429) or failed with a server error (5xx) are retried.
+
     Examples:
         >>> client = GithubClient("my_github_token")
         >>> branch_info = client.get_branch("owner", "repo", "branch")
     """
 
     DEFAULT_BASE_URL = "https://api.github.com"
+    DEFAULT_RAW_BASE_URL = "https://raw.githubusercontent.com"
     DEFAULT_API_VERSION = "2022-11-28"
 
     def __init__(
@@ -164,6 +232,10 @@ class GithubClient:
         base_url: str = DEFAULT_BASE_URL,
         api_version: str = DEFAULT_API_VERSION,
         verbose: bool = False,
+        raw_base_url: str = DEFAULT_RAW_BASE_URL,
+        cache_dir: Optional[str] = None,
+        max_concurrent_requests: int = 10,
+        max_retries: int = 5,
     ) -> None:
         """
         Initialize the GithubClient.
@@ -175,6 +247,15 @@ class GithubClient:
             - base_url (str): Base URL for the Github API
                 (defaults to "https://api.github.com").
             - api_version (str): Github API version (defaults to "2022-11-28").
+            - raw_base_url (str): Base URL for the raw contents of the files
+                (defaults to "https://raw.githubusercontent.com").
+            - cache_dir (str): Directory to cache the responses in, to make
+                conditional requests when they are requested again.
+                Conditional requests are disabled if not provided.
+            - max_concurrent_requests (int): Maximum number of requests
+                in flight at once (defaults to 10).
+            - max_retries (int): Maximum number of times a rate limited
+                or failed (5xx) request is retried (defaults to 5).
 
         Raises:
             ValueError: If no Github token is provided.
@@ -197,6 +278,9 @@ class GithubClient:
             "getBranch": "/repos/{owner}/{repo}/branches/{branch}",
             "getBlob": "/repos/{owner}/{repo}/git/blobs/{file_sha}",
             "getCommit": "/repos/{owner}/{repo}/commits/{commit_sha}",
+            "getTarball": "/repos/{owner}/{repo}/tarball/{ref}",
+            "getRawFile": raw_base_url + "/{owner}/{repo}/{ref}/{path}",
+            "graphql": "/graphql",
         }
 
         self._headers = {
@@ -205,6 +289,106 @@ class GithubClient:
             "X-GitHub-Api-Version": f"{self._api_version}",
         }
 
+        self._client: Any = None
+        self._max_concurrent_requests = max_concurrent_requests
+        self._max_retries = max_retries
+        # created along with the client, so that it is bound to the running loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # time (epoch seconds) until which the rate limit is exhausted
+        self._rate_limit_reset_at = 0.0
+        self._etag_cache = ETagCache(cache_dir) if cache_dir is not None else None
+
+    def _get_client(self) -> Any:
+        """
+        Get the HTTP client, creating it on first use.
+
+        Returns:
+            - `client (httpx.AsyncClient)`: Client shared by all the requests.
+
+        Raises:
+            - ImportError: If the `httpx` library is not installed.
+        """
+        if self._client is None:
+            try:
+                import httpx
+            except ImportError:
+                raise ImportError(
+                    "Please install httpx to use the GithubRepositoryReader. "
+                    "You can do so by running `pip install httpx`."
+                )
+
+            self._client = httpx.AsyncClient(
+                headers=self._headers, base_url=self._base_url
+            )
+            self._semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore bounding the number of requests in flight."""
+        self._get_client()
+        assert self._semaphore is not None
+        return self._semaphore
+
+    async def _wait_for_rate_limit(self) -> None:
+        """Wait until the rate limit resets if it has been exhausted."""
+        delay = self._rate_limit_reset_at - time.time()
+        if delay > 0:
+            if self._verbose:
+                print(f"Rate limit exhausted, waiting {delay:.0f} seconds")
+            await asyncio.sleep(delay)
+
+    def _update_rate_limit(self, response: Any) -> None:
+        """Remember when the rate limit resets if the response exhausted it."""
+        if (
+            response.headers.get("X-RateLimit-Remaining") == "0"
+            and "X-RateLimit-Reset" in response.headers
+        ):
+            self._rate_limit_reset_at = max(
+                self._rate_limit_reset_at,
+                float(response.headers["X-RateLimit-Reset"]),
+            )
+
+    def _get_retry_delay(self, response: Any, attempt: int) -> Optional[float]:
+        """
+        Get how long to wait before retrying a request.
+
+        Args:
+            - `response (httpx.Response)`: Response of the failed attempt.
+            - `attempt (int)`: Number of the failed attempt (starting from 0).
+
+        Returns:
+            - `delay (float)`: Seconds to wait before retrying,
+                None if the request should not be retried.
+        """
+        status_code = response.status_code
+        if status_code in (403, 429):
+            if "Retry-After" in response.headers:
+                return float(response.headers["Retry-After"])
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                return max(0.0, self._rate_limit_reset_at - time.time())
+            if status_code == 429:
+                return 60.0
+            # a 403 without rate limit headers is a permission error
+            return None
+        if status_code >= 500:
+            # exponential backoff with jitter, capped to a minute
+            return min(2**attempt + random.random(), 60.0)
+        return None
+
+    async def aclose(self) -> None:
+        """Close the connections of the client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "GithubClient":
+        """Enter the async context manager."""
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        """Close the connections when exiting the async context manager."""
+        await self.aclose()
+
     def get_all_endpoints(self) -> Dict[str, str]:
         """Get all available endpoints."""
         return {**self._endpoints}
@@ -214,6 +398,9 @@ class GithubClient:
         endpoint: str,
         method: str,
         headers: Dict[str, Any] = {},
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        conditional: bool = False,
         **kwargs: Any,
     ) -> Any:
         """
@@ -226,6 +413,12 @@ class GithubClient:
             - `endpoint (str)`: Name of the endpoint to make the request to.
             - `method (str)`: HTTP method to use for the request.
             - `headers (dict)`: HTTP headers to include in the request.
+            - `params (dict)`: Query parameters to include in the request.
+            - `json (dict)`: JSON body of the request.
+            - `conditional (bool)`: Whether to cache the response with its ETag
+                and make a conditional request the next time (only if the
+                client has a `cache_dir`). Meant for responses that can change
+                and that are not cached by SHA, i.e. branches.
             - `**kwargs`: Keyword arguments to pass to the endpoint URL.
 
         Returns:
@@ -235,33 +428,70 @@ class GithubClient:
             - ImportError: If the `httpx` library is not installed.
             - httpx.HTTPError: If the API request fails.
 
+        Rate limited (403/429) and failed (5xx) requests are retried up to
+        `max_retries` times, waiting as long as the `Retry-After` or
+        `X-RateLimit-Reset` headers ask for, or backing off exponentially.
+
         Examples:
             >>> response = client.request("getTree", "GET",
                                 owner="owner", repo="repo",
                                 tree_sha="tree_sha")
         """
-        try:
-            import httpx
-        except ImportError:
-            raise ImportError(
-                "Please install httpx to use the GithubRepositoryReader. "
-                "You can do so by running `pip install httpx`."
-            )
-
-        _headers = {**self._headers, **headers}
-
-        _client: httpx.AsyncClient
-        async with httpx.AsyncClient(
-            headers=_headers, base_url=self._base_url
-        ) as _client:
+        _client = self._get_client()
+
+        import httpx
+
+        url = self._endpoints[endpoint].format(**kwargs)
+        cache_key = None
+        cached_response = None
+        if self._etag_cache is not None and conditional and method == "GET":
+            # the same URL returns different content depending on the media type
+            accept = headers.get("Accept", self._headers["Accept"])
+            cache_key = f"{url}?{params}|{accept}"
+            cached_response = self._etag_cache.get(cache_key)
+            if cached_response is not None:
+                headers = {**headers, "If-None-Match": cached_response[0]}
+
+        attempt = 0
+        while True:
+            await self._wait_for_rate_limit()
             try:
-                response = await _client.request(
-                    method, url=self._endpoints[endpoint].format(**kwargs)
-                )
+                async with self._get_semaphore():
+                    response = await _client.request(
+                        method,
+                        url=url,
+                        headers=headers,
+                        params=params,
+                        json=json,
+                    )
             except httpx.HTTPError as excp:
                 print(f"HTTP Exception for {excp.request.url} - {excp}")
                 raise excp
-            return response
+
+            self._update_rate_limit(response)
+            delay = self._get_retry_delay(response, attempt)
+            if delay is None or attempt >= self._max_retries:
+                break
+            if self._verbose:
+                print(
+                    f"Got {response.status_code} for {url}, "
+                    + f"retrying in {delay:.0f} seconds"
+                )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        if cached_response is not None and response.status_code == 304:
+            return httpx.Response(
+                200, content=cached_response[1], request=response.request
+            )
+        if (
+            self._etag_cache is not None
+            and cache_key is not None
+            and response.status_code == 200
+            and "ETag" in response.headers
+        ):
+            self._etag_cache.set(cache_key, response.headers["ETag"], response.content)
+        return response
 
     async def get_branch(
         self, owner: str, repo: str, branch: str
@@ -283,13 +513,18 @@ class GithubClient:
         return GitBranchResponseModel.from_json(
             (
                 await self.request(
-                    "getBranch", "GET", owner=owner, repo=repo, branch=branch
+                    "getBranch",
+                    "GET",
+                    conditional=True,
+                    owner=owner,
+                    repo=repo,
+                    branch=branch,
                 )
             ).text
         )
 
     async def get_tree(
-        self, owner: str, repo: str, tree_sha: str
+        self, owner: str, repo: str, tree_sha: str, recursive: bool = False
     ) -> GitTreeResponseModel:
         """
         Get information about a tree. (Github API endpoint: getTree).
@@ -298,6 +533,10 @@ class GithubClient:
             - `owner (str)`: Owner of the repository.
             - `repo (str)`: Name of the repository.
             - `tree_sha (str)`: SHA of the tree.
+            - `recursive (bool)`: Whether to list the whole tree in one response.
+                The paths of the objects are then relative to the tree,
+                and the tree is truncated if it is too large
+                (see GitTreeResponseModel.truncated).
 
         Returns:
             - `tree_info (GitTreeResponseModel)`: Information about the tree.
@@ -308,7 +547,12 @@ class GithubClient:
         return GitTreeResponseModel.from_json(
             (
                 await self.request(
-                    "getTree", "GET", owner=owner, repo=repo, tree_sha=tree_sha
+                    "getTree",
+                    "GET",
+                    params={"recursive": 1} if recursive else None,
+                    owner=owner,
+                    repo=repo,
+                    tree_sha=tree_sha,
                 )
             ).text
         )
@@ -338,6 +582,102 @@ class GithubClient:
             ).text
         )
 
+    async def get_raw_blob(self, owner: str, repo: str, file_sha: str) -> bytes:
+        """
+        Get the raw content of a blob. (Github API endpoint: getBlob).
+
+        Unlike `get_blob`, the content is requested with the raw media type,
+        so it is sent as is instead of base64-encoded in a JSON document.
+
+        Args:
+            - `owner (str)`: Owner of the repository.
+            - `repo (str)`: Name of the repository.
+            - `file_sha (str)`: SHA of the file.
+
+        Returns:
+            - `content (bytes)`: Content of the blob.
+
+        Raises:
+            - httpx.HTTPStatusError: If the blob could not be retrieved.
+
+        Examples:
+            >>> content = client.get_raw_blob("owner", "repo", "file_sha")
+        """
+        response = await self.request(
+            "getBlob",
+            "GET",
+            headers={"Accept": "application/vnd.github.raw"},
+            owner=owner,
+            repo=repo,
+            file_sha=file_sha,
+        )
+        response.raise_for_status()
+        return response.content
+
+    async def get_text_blobs(
+        self, owner: str, repo: str, file_shas: List[str]
+    ) -> Dict[str, bytes]:
+        """
+        Get the content of several text blobs at once. (Github GraphQL API).
+
+        All the blobs are requested in a single GraphQL query.
+        The GraphQL API only returns the content of text blobs
+        (and truncates the large ones), so binary and truncated blobs are
+        left out of the result and have to be retrieved with `get_raw_blob`.
+
+        Args:
+            - `owner (str)`: Owner of the repository.
+            - `repo (str)`: Name of the repository.
+            - `file_shas (List[str])`: SHAs of the files.
+
+        Returns:
+            - `contents (Dict[str, bytes])`: Content of the text blobs,
+                keyed by their SHA.
+
+        Raises:
+            - httpx.HTTPStatusError: If the request fails.
+            - ValueError: If the query returns errors.
+
+        Examples:
+            >>> contents = client.get_text_blobs("owner", "repo", ["sha1", "sha2"])
+        """
+        variables: Dict[str, Any] = {"owner": owner, "name": repo}
+        declarations = ["$owner: String!", "$name: String!"]
+        fields = []
+        for i, file_sha in enumerate(file_shas):
+            variables[f"oid{i}"] = file_sha
+            declarations.append(f"$oid{i}: GitObjectID!")
+            fields.append(
+                f"b{i}: object(oid: $oid{i}) "
+                + "{ ... on Blob { oid text isBinary isTruncated } }"
+            )
+        query = (
+            f"query({', '.join(declarations)}) "
+            + "{ repository(owner: $owner, name: $name) { "
+            + " ".join(fields)
+            + " } }"
+        )
+
+        response = await self.request(
+            "graphql", "POST", json={"query": query, "variables": variables}
+        )
+        response.raise_for_status()
+        data = response.json()
+        if data.get("errors"):
+            raise ValueError(f"GraphQL query failed: {data['errors']}")
+
+        contents = {}
+        for blob in data["data"]["repository"].values():
+            if (
+                blob is None
+                or blob["isBinary"]
+                or blob["isTruncated"]
+                or blob["text"] is None
+            ):
+                continue
+            contents[blob["oid"]] = blob["text"].encode("utf-8")
+        return contents
+
     async def get_commit(
         self, owner: str, repo: str, commit_sha: str
     ) -> GitCommitResponseModel:
@@ -358,11 +698,100 @@ class GithubClient:
         return GitCommitResponseModel.from_json(
             (
                 await self.request(
-                    "getCommit", "GET", owner=owner, repo=repo, commit_sha=commit_sha
+                    "getCommit",
+                    "GET",
+                    owner=owner,
+                    repo=repo,
+                    commit_sha=commit_sha,
                 )
             ).text
         )
 
+    async def get_raw_file(
+        self,
+        owner: str,
+        repo: str,
+        ref: str,
+        path: str,
+        byte_range: Optional[Tuple[int, int]] = None,
+    ) -> bytes:
+        """
+        Get the raw content of a file (served by raw.githubusercontent.com).
+
+        Args:
+            - `owner (str)`: Owner of the repository.
+            - `repo (str)`: Name of the repository.
+            - `ref (str)`: Branch name or commit SHA.
+            - `path (str)`: Path of the file relative to the root of the repository.
+            - `byte_range (Tuple[int, int])`: First and last (inclusive) bytes
+                to get. If the server ignores the range,
+                the whole content is returned.
+
+        Returns:
+            - `content (bytes)`: Content of the file (or of the requested range).
+
+        Raises:
+            - httpx.HTTPStatusError: If the file could not be retrieved.
+
+        Examples:
+            >>> content = client.get_raw_file("owner", "repo", "ref", "README.md")
+        """
+        headers = {}
+        if byte_range is not None:
+            headers["Range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+            # the ranges would apply to the compressed content otherwise
+            headers["Accept-Encoding"] = "identity"
+        response = await self.request(
+            "getRawFile",
+            "GET",
+            headers=headers,
+            owner=owner,
+            repo=repo,
+            ref=ref,
+            path=quote(path),
+        )
+        response.raise_for_status()
+        return response.content
+
+    async def download_tarball(
+        self, owner: str, repo: str, ref: str
+    ) -> AsyncIterator[bytes]:
+        """
+        Download a snapshot of the repository. (Github API endpoint: getTarball).
+
+        The gzipped tarball is streamed in chunks as it is downloaded.
+        The paths in the archive are prefixed by a top-level directory
+        named after the repository and the commit.
+
+        Args:
+            - `owner (str)`: Owner of the repository.
+            - `repo (str)`: Name of the repository.
+            - `ref (str)`: Branch name or commit SHA to download.
+
+        Returns:
+            - `chunks (AsyncIterator[bytes])`: Chunks of the gzipped tarball.
+
+        Raises:
+            - ImportError: If the `httpx` library is not installed.
+            - httpx.HTTPError: If the download fails.
+
+        Examples:
+            >>> async for chunk in client.download_tarball("owner", "repo", "ref"):
+            ...     f.write(chunk)
+        """
+        _client = self._get_client()
+        await self._wait_for_rate_limit()
+        # the endpoint redirects to a temporary download URL on codeload.github.com
+        async with self._get_semaphore(), _client.stream(
+            "GET",
+            self._endpoints["getTarball"].format(owner=owner, repo=repo, ref=ref),
+            follow_redirects=True,
+        ) as response:
+            self._update_rate_limit(response)
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+
 
 if __name__ == "__main__":
     import asyncio
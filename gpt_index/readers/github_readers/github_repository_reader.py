@@ -7,13 +7,24 @@ the text extracted from the files using the parser.
 """
 
 import asyncio
-import base64
-import binascii
 import logging
 import os
 import pathlib
+import sys
+import tarfile
 import tempfile
-from typing import Any, Callable, List, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
 from gpt_index.readers.base import BaseReader
 from gpt_index.readers.file.base import DEFAULT_FILE_EXTRACTOR
@@ -25,7 +36,9 @@ from gpt_index.readers.github_readers.github_api_client import (
 )
 from gpt_index.readers.github_readers.utils import (
     BufferedGitBlobDataIterator,
+    GitObjectCache,
     get_file_extension,
+    get_git_blob_sha,
     print_if_verbose,
 )
 from gpt_index.readers.schema.base import Document
@@ -34,6 +47,13 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Number of blobs requested in a single GraphQL query
+GRAPHQL_BATCH_SIZE = 50
+
+# Number of leading bytes scanned for a NUL byte to detect binary files
+BINARY_SNIFF_SIZE = 8192
+
+
 class GithubRepositoryReader(BaseReader):
     """
     Github repository reader.
@@ -42,10 +62,17 @@ class GithubRepositoryReader(BaseReader):
     The documents are either the contents of the files in the repository or the text
     extracted from the files using the parser.
 
+    The connections to Github are kept open between loads,
+    call `close` (or use the reader as a context manager) once done.
+
     Examples:
         >>> reader = GithubRepositoryReader("owner", "repo")
         >>> branch_documents = reader.load_data(branch="branch")
         >>> commit_documents = reader.load_data(commit_sha="commit_sha")
+        >>> for document in reader.lazy_load_data(branch="branch"):
+        ...     print(document.extra_info)
+        >>> with GithubRepositoryReader("owner", "repo") as reader:
+        ...     documents = reader.load_data(branch="branch")
 
     """
 
@@ -59,6 +86,14 @@ class GithubRepositoryReader(BaseReader):
         concurrent_requests: int = 5,
         ignore_file_extensions: Optional[List[str]] = None,
         ignore_directories: Optional[List[str]] = None,
+        include_file_extensions: Optional[List[str]] = None,
+        max_file_size: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        cache_max_size: Optional[int] = None,
+        use_tarball: bool = False,
+        parser_workers: int = 0,
+        large_file_threshold: int = 4 * 1024 * 1024,
+        use_graphql: bool = False,
     ):
         """
         Initialize params.
@@ -71,12 +106,41 @@ class GithubRepositoryReader(BaseReader):
             - verbose (bool): Whether to print verbose messages.
             - github_token (str): Github token. If not provided,
                 it will be read from the GITHUB_TOKEN environment variable.
-            - concurrent_requests (int): Number of concurrent requests to
-                make to the Github API.
+            - concurrent_requests (int): Maximum number of concurrent requests
+                to make to Github.
             - ignore_file_extensions (List[str]): List of file extensions to ignore.
                 i.e. ['.png', '.jpg']
             - ignore_directories (List[str]): List of directories to ignore.
                 i.e. ['node_modules', 'dist']
+            - include_file_extensions (List[str]): List of file extensions to load,
+                all the other files are ignored. i.e. ['.py', '.md']
+            - max_file_size (int): Files larger than this size (in bytes)
+                are ignored.
+            - cache_dir (str): Directory to cache the downloaded blobs and trees
+                in, so that they are not downloaded again on the next load.
+                Branches are cached with their ETag
+                and only downloaded again if they changed.
+                Caching is disabled if not provided.
+            - cache_max_size (int): Maximum size (in bytes) of the cached blobs
+                and trees, the least recently used ones are evicted beyond it.
+                If not provided, the cache directory is never pruned.
+            - use_tarball (bool): Whether to download the contents of the files
+                as a single tarball of the repository instead of one request
+                per file. Faster when loading most of the repository,
+                wasteful when the filters exclude most of it.
+            - parser_workers (int): Number of worker processes used to parse
+                the files supported by a parser, while the other files are
+                being downloaded. Defaults to 0, the files are then parsed
+                in the main process, in order. Each worker initializes its own
+                parsers (i.e. loads the image model). As the workers may be
+                spawned (the default on macOS and Windows), the script creating
+                the reader must guard its entry point with
+                `if __name__ == "__main__":`.
+            - large_file_threshold (int): Files larger than this size (in bytes)
+                are downloaded in several chunks in parallel.
+            - use_graphql (bool): Whether to download the text files in batches
+                (see GRAPHQL_BATCH_SIZE) with the GraphQL API,
+                instead of one request per file.
 
         Raises:
             - `ValueError`: If the github_token is not provided and
@@ -99,6 +163,17 @@ class GithubRepositoryReader(BaseReader):
         self._concurrent_requests = concurrent_requests
         self._ignore_file_extensions = ignore_file_extensions
         self._ignore_directories = ignore_directories
+        self._include_file_extensions = include_file_extensions
+        self._max_file_size = max_file_size
+        self._cache = (
+            GitObjectCache(cache_dir, max_size=cache_max_size)
+            if cache_dir is not None
+            else None
+        )
+        self._use_tarball = use_tarball
+        self._large_file_threshold = large_file_threshold
+        self._use_graphql = use_graphql
+        self._parser_workers = parser_workers
 
         # Set up the event loop
         try:
@@ -108,9 +183,30 @@ class GithubRepositoryReader(BaseReader):
             self._loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self._loop)
 
-        self._client = GithubClient(github_token)
+        self._client = GithubClient(
+            github_token,
+            verbose=verbose,
+            cache_dir=os.path.join(cache_dir, "responses")
+            if cache_dir is not None
+            else None,
+            max_concurrent_requests=concurrent_requests,
+        )
 
-    def _load_data_from_commit(self, commit_sha: str) -> List[Document]:
+    def close(self) -> None:
+        """Close the connections to Github."""
+        self._loop.run_until_complete(self._client.aclose())
+
+    def __enter__(self) -> "GithubRepositoryReader":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Close the connections to Github when exiting the context manager."""
+        self.close()
+
+    def _load_data_from_commit(
+        self, commit_sha: str
+    ) -> Generator[Document, None, None]:
         """
         Load data from a commit.
 
@@ -118,22 +214,22 @@ class GithubRepositoryReader(BaseReader):
 
         :param `commit`: commit sha
 
-        :return: list of documents
+        :return: iterator of documents
         """
-        commit_response: GitCommitResponseModel = self._loop.run_until_complete(
-            self._client.get_commit(self._owner, self._repo, commit_sha)
-        )
+        commit_response = self._loop.run_until_complete(self._get_commit(commit_sha))
 
         tree_sha = commit_response.commit.tree.sha
-        blobs_and_paths = self._loop.run_until_complete(self._recurse_tree(tree_sha))
+        blobs_and_paths = self._loop.run_until_complete(
+            self._get_blobs_and_paths(tree_sha)
+        )
 
-        print_if_verbose(self._verbose, f"got {len(blobs_and_paths)} blobs")
+        print_if_verbose(self._verbose, "got %d blobs", len(blobs_and_paths))
 
-        return self._loop.run_until_complete(
-            self._generate_documents(blobs_and_paths=blobs_and_paths)
+        return self._iterate(
+            self._generate_documents(blobs_and_paths=blobs_and_paths, ref=commit_sha)
         )
 
-    def _load_data_from_branch(self, branch: str) -> List[Document]:
+    def _load_data_from_branch(self, branch: str) -> Generator[Document, None, None]:
         """
         Load data from a branch.
 
@@ -141,21 +237,47 @@ class GithubRepositoryReader(BaseReader):
 
         :param `branch`: branch name
 
-        :return: list of documents
+        :return: iterator of documents
         """
         branch_data: GitBranchResponseModel = self._loop.run_until_complete(
             self._client.get_branch(self._owner, self._repo, branch)
         )
 
         tree_sha = branch_data.commit.commit.tree.sha
-        blobs_and_paths = self._loop.run_until_complete(self._recurse_tree(tree_sha))
+        blobs_and_paths = self._loop.run_until_complete(
+            self._get_blobs_and_paths(tree_sha)
+        )
 
-        print_if_verbose(self._verbose, f"got {len(blobs_and_paths)} blobs")
+        print_if_verbose(self._verbose, "got %d blobs", len(blobs_and_paths))
 
-        return self._loop.run_until_complete(
-            self._generate_documents(blobs_and_paths=blobs_and_paths)
+        return self._iterate(
+            self._generate_documents(
+                blobs_and_paths=blobs_and_paths, ref=branch_data.commit.sha
+            )
         )
 
+    def _iterate(
+        self, documents: AsyncGenerator[Document, None]
+    ) -> Generator[Document, None, None]:
+        """
+        Iterate over an async iterator of documents from synchronous code.
+
+        The event loop only runs while the next document is requested,
+        the pending requests are resumed on the next call.
+
+        :param `documents`: async iterator of documents
+        :return: iterator of documents
+        """
+        try:
+            while True:
+                try:
+                    yield self._loop.run_until_complete(documents.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # run the cleanup of the async generators if the iteration is stopped
+            self._loop.run_until_complete(documents.aclose())
+
     def load_data(
         self,
         commit_sha: Optional[str] = None,
@@ -165,12 +287,34 @@ class GithubRepositoryReader(BaseReader):
         Load data from a commit or a branch.
 
         Loads github repository data from a specific commit sha or a branch.
+        The documents are in the order of the files in the repository,
+        except if `parser_workers` is set: the parsed files then come
+        as they are parsed, in no particular order.
 
         :param `commit`: commit sha
         :param `branch`: branch name
 
         :return: list of documents
         """
+        return list(self.lazy_load_data(commit_sha=commit_sha, branch=branch))
+
+    def lazy_load_data(
+        self,
+        commit_sha: Optional[str] = None,
+        branch: Optional[str] = None,
+    ) -> Generator[Document, None, None]:
+        """
+        Load data from a commit or a branch, one document at a time.
+
+        Same as `load_data`, but the documents are yielded as soon as their
+        file is downloaded (and parsed) instead of being collected in a list,
+        so only a bounded number of files are held in memory at once.
+
+        :param `commit`: commit sha
+        :param `branch`: branch name
+
+        :return: iterator of documents
+        """
         if commit_sha is not None and branch is not None:
             raise ValueError("You can only specify one of commit or branch.")
 
@@ -185,6 +329,125 @@ class GithubRepositoryReader(BaseReader):
 
         raise ValueError("You must specify one of commit or branch.")
 
+    def _should_ignore_blob(
+        self, blob: GitTreeResponseModel.GitTreeObject, file_path: str
+    ) -> bool:
+        """
+        Check whether a blob is filtered out, before downloading it.
+
+        :param `blob`: tree object of the blob
+        :param `file_path`: file's full path realtive to the root of the repo
+        :return: True if the blob should not be loaded
+        """
+        file_extension = get_file_extension(file_path)
+        if (
+            self._ignore_file_extensions is not None
+            and file_extension in self._ignore_file_extensions
+        ):
+            return True
+        if (
+            self._include_file_extensions is not None
+            and file_extension not in self._include_file_extensions
+        ):
+            return True
+        if (
+            self._max_file_size is not None
+            and blob.size is not None
+            and blob.size > self._max_file_size
+        ):
+            return True
+        return False
+
+    def _should_ignore_directory(self, path: str) -> bool:
+        """
+        Check whether a path is in one of the ignored directories.
+
+        :param `path`: path realtive to the root of the repo
+        :return: True if the path or one of its parents is ignored
+        """
+        if self._ignore_directories is None:
+            return False
+        parts = path.split("/")
+        return any(
+            "/".join(parts[:i]) in self._ignore_directories
+            for i in range(1, len(parts) + 1)
+        )
+
+    async def _get_commit(self, commit_sha: str) -> GitCommitResponseModel:
+        """
+        Get a commit, from the cache if possible.
+
+        Only commits requested by their full SHA are cached,
+        as any other ref (i.e. a short SHA) may point to another commit later.
+
+        :param `commit_sha`: sha of the commit
+        :return: the commit
+        """
+        if self._cache is not None:
+            cached_commit = self._cache.get_commit(commit_sha)
+            if cached_commit is not None:
+                return cached_commit
+
+        commit_data = await self._client.get_commit(self._owner, self._repo, commit_sha)
+        if self._cache is not None and commit_data.sha == commit_sha:
+            self._cache.set_commit(commit_sha, commit_data)
+        return commit_data
+
+    async def _get_tree(
+        self, tree_sha: str, recursive: bool = False
+    ) -> GitTreeResponseModel:
+        """
+        Get a tree, from the cache if possible.
+
+        :param `tree_sha`: sha of the tree
+        :param `recursive`: whether to list the whole tree in one request
+        :return: the tree
+        """
+        if self._cache is not None:
+            cached_tree = self._cache.get_tree(tree_sha, recursive=recursive)
+            if cached_tree is not None:
+                return cached_tree
+
+        tree_data = await self._client.get_tree(
+            self._owner, self._repo, tree_sha, recursive=recursive
+        )
+        if self._cache is not None:
+            self._cache.set_tree(tree_sha, tree_data, recursive=recursive)
+        return tree_data
+
+    async def _get_blobs_and_paths(
+        self, tree_sha: str
+    ) -> List[Tuple[GitTreeResponseModel.GitTreeObject, str]]:
+        """
+        Get all the blob tree objects of a tree, with their full path.
+
+        The whole tree is listed with a single recursive getTree request.
+        If Github truncates the listing because the tree is too large,
+        falls back to walking the tree one directory at a time.
+
+        :param `tree_sha`: sha of the root tree
+        :return: list of tuples of
+            (tree object, file's full path realtive to the root of the repo)
+        """
+        tree_data = await self._get_tree(tree_sha, recursive=True)
+        if tree_data.truncated:
+            print_if_verbose(
+                self._verbose, "tree %s is truncated, walking it instead", tree_sha
+            )
+            return await self._recurse_tree(tree_sha)
+
+        blobs_and_full_paths: List[Tuple[GitTreeResponseModel.GitTreeObject, str]] = []
+        for tree_obj in tree_data.tree:
+            if tree_obj.type != "blob":
+                continue
+            if self._should_ignore_directory(os.path.dirname(tree_obj.path)):
+                continue
+            if self._should_ignore_blob(tree_obj, tree_obj.path):
+                print_if_verbose(self._verbose, "ignoring blob %s", tree_obj.path)
+                continue
+            blobs_and_full_paths.append((tree_obj, tree_obj.path))
+        return blobs_and_full_paths
+
     async def _recurse_tree(
         self, tree_sha: str, current_path: str = "", current_depth: int = 0
     ) -> Any:
@@ -195,6 +458,9 @@ class GithubRepositoryReader(BaseReader):
         (see GitTreeResponseModel.GitTreeObject in
             github_api_client.py for more information)
 
+        Subtrees are walked concurrently, with at most `concurrent_requests`
+        getTree requests in flight at the same time.
+
         :param `tree_sha`: sha of the tree to recurse
         :param `current_path`: current path of the tree
         :param `current_depth`: current depth of the tree
@@ -202,184 +468,526 @@ class GithubRepositoryReader(BaseReader):
             (tree object, file's full path realtive to the root of the repo)
         """
         blobs_and_full_paths: List[Tuple[GitTreeResponseModel.GitTreeObject, str]] = []
-        print_if_verbose(
-            self._verbose, "\t" * current_depth + f"current path: {current_path}"
-        )
+        indent = "\t" * current_depth
+        print_if_verbose(self._verbose, "%scurrent path: %s", indent, current_path)
 
-        tree_data: GitTreeResponseModel = await self._client.get_tree(
-            self._owner, self._repo, tree_sha
-        )
-        print_if_verbose(
-            self._verbose, "\t" * current_depth + f"processing tree {tree_sha}"
-        )
+        tree_data = await self._get_tree(tree_sha)
+        print_if_verbose(self._verbose, "%sprocessing tree %s", indent, tree_sha)
+        # blobs and pending subtree walks, kept in the order of the tree listing
+        entries: List[Any] = []
         for tree_obj in tree_data.tree:
             file_path = os.path.join(current_path, tree_obj.path)
             if tree_obj.type == "tree":
                 print_if_verbose(
-                    self._verbose,
-                    "\t" * current_depth + f"recursing into {tree_obj.path}",
+                    self._verbose, "%srecursing into %s", indent, tree_obj.path
                 )
                 if self._ignore_directories is not None:
                     if file_path in self._ignore_directories:
                         print_if_verbose(
                             self._verbose,
-                            "\t" * current_depth
-                            + f"ignoring tree {tree_obj.path} due to directory",
+                            "%signoring tree %s due to directory",
+                            indent,
+                            tree_obj.path,
                         )
                         continue
 
-                blobs_and_full_paths.extend(
-                    await self._recurse_tree(tree_obj.sha, file_path, current_depth + 1)
+                entries.append(
+                    asyncio.create_task(
+                        self._recurse_tree(tree_obj.sha, file_path, current_depth + 1)
+                    )
                 )
             elif tree_obj.type == "blob":
                 print_if_verbose(
-                    self._verbose, "\t" * current_depth + f"found blob {tree_obj.path}"
+                    self._verbose, "%sfound blob %s", indent, tree_obj.path
                 )
-                if self._ignore_file_extensions is not None:
-                    if get_file_extension(file_path) in self._ignore_file_extensions:
+                if self._should_ignore_blob(tree_obj, file_path):
+                    print_if_verbose(
+                        self._verbose, "%signoring blob %s", indent, tree_obj.path
+                    )
+                    continue
+                entries.append((tree_obj, file_path))
+
+        await asyncio.gather(
+            *[entry for entry in entries if isinstance(entry, asyncio.Task)]
+        )
+        for entry in entries:
+            if isinstance(entry, asyncio.Task):
+                blobs_and_full_paths.extend(entry.result())
+            else:
+                blobs_and_full_paths.append(entry)
+        return blobs_and_full_paths
+
+    async def _get_blob_contents_from_tarball(
+        self,
+        blobs_and_paths: List[Tuple[GitTreeResponseModel.GitTreeObject, str]],
+        ref: str,
+    ) -> AsyncGenerator[Tuple[GitTreeResponseModel.GitTreeObject, str, bytes], None]:
+        """
+        Get the contents of a list of blobs from a tarball of the repository.
+
+        The tarball is streamed to a temporary file, then read sequentially
+        and only the members matching one of the blobs are extracted.
+        Members whose content is not the blob's (i.e. rewritten by the
+        export-subst or eol attributes) are skipped.
+
+        :param `blobs_and_paths`: list of tuples of
+            (tree object, file's full path in the repo realtive to the root of the repo)
+        :param `ref`: commit sha the blobs belong to
+        :return: async iterator of tuples of
+            (tree object, file's full path, content of the blob)
+        """
+        blobs_by_path = {full_path: blob for blob, full_path in blobs_and_paths}
+        with tempfile.TemporaryFile() as tarball_file:
+            async for chunk in self._client.download_tarball(
+                self._owner, self._repo, ref
+            ):
+                tarball_file.write(chunk)
+            print_if_verbose(
+                self._verbose, "downloaded tarball of %d bytes", tarball_file.tell()
+            )
+            tarball_file.seek(0)
+
+            with tarfile.open(fileobj=tarball_file, mode="r|gz") as tarball:
+                for member in tarball:
+                    # strip the top-level "{owner}-{repo}-{sha}/" directory
+                    _, _, full_path = member.name.partition("/")
+                    blob = blobs_by_path.get(full_path)
+                    if blob is None:
+                        continue
+                    if member.issym():
+                        # the content of a symlink blob is the path it points to
+                        content = member.linkname.encode("utf-8")
+                    else:
+                        member_file = tarball.extractfile(member)
+                        if member_file is None:
+                            continue
+                        content = member_file.read()
+                    if get_git_blob_sha(content) != blob.sha:
                         print_if_verbose(
-                            self._verbose,
-                            "\t" * current_depth
-                            + f"ignoring blob {tree_obj.path} due to file extension",
+                            self._verbose, "%s differs in the tarball", full_path
                         )
                         continue
-                blobs_and_full_paths.append((tree_obj, file_path))
-        return blobs_and_full_paths
+                    yield blob, full_path, content
 
-    async def _generate_documents(
+    async def _download_large_blob(
+        self, blob: GitTreeResponseModel.GitTreeObject, full_path: str, ref: str
+    ) -> bytes:
+        """
+        Download a large blob as several byte ranges in parallel.
+
+        A single stream is usually not enough to saturate the bandwidth,
+        the number of ranges grows with the size of the blob
+        (one per `large_file_threshold` bytes, between 2 and 16).
+        The caller has to check the size of the result, the ranges are
+        served by raw.githubusercontent.com and not checked against the blob.
+
+        :param `blob`: tree object of the blob
+        :param `full_path`: file's full path realtive to the root of the repo
+        :param `ref`: commit sha the blob belongs to
+        :return: content of the blob
+        """
+        size = blob.size or 0
+        num_chunks = max(2, min(16, size // self._large_file_threshold))
+        chunk_size = -(-size // num_chunks)
+        print_if_verbose(
+            self._verbose, "downloading %s in %d chunks", full_path, num_chunks
+        )
+        chunks = await asyncio.gather(
+            *[
+                self._client.get_raw_file(
+                    self._owner,
+                    self._repo,
+                    ref,
+                    full_path,
+                    byte_range=(start, min(start + chunk_size, size) - 1),
+                )
+                for start in range(0, size, chunk_size)
+            ]
+        )
+        # the server answers with the whole file if it ignores the ranges
+        for chunk in chunks:
+            if len(chunk) == size:
+                return chunk
+        return b"".join(chunks)
+
+    async def _get_blob_contents_with_graphql(
         self, blobs_and_paths: List[Tuple[GitTreeResponseModel.GitTreeObject, str]]
-    ) -> List[Document]:
+    ) -> AsyncGenerator[Tuple[GitTreeResponseModel.GitTreeObject, str, bytes], None]:
         """
-        Generate documents from a list of blobs and their full paths.
+        Get the contents of the text blobs of a list, in batches.
+
+        The blobs are requested GRAPHQL_BATCH_SIZE at a time, with up to
+        `concurrent_requests` batches in flight. Binary and truncated blobs
+        are not returned by the GraphQL API and are skipped. So are the blobs
+        whose text does not hash to their SHA, i.e. transcoded from
+        another encoding than utf-8.
 
         :param `blobs_and_paths`: list of tuples of
             (tree object, file's full path in the repo realtive to the root of the repo)
-        :return: list of documents
+        :return: async iterator of tuples of
+            (tree object, file's full path, content of the blob)
+        """
+        # identical files share a blob, they are all yielded from one download
+        entries_by_sha: Dict[
+            str, List[Tuple[GitTreeResponseModel.GitTreeObject, str]]
+        ] = {}
+        for blob, full_path in blobs_and_paths:
+            entries_by_sha.setdefault(blob.sha, []).append((blob, full_path))
+        unique_shas = list(entries_by_sha)
+        batches = [
+            unique_shas[i : i + GRAPHQL_BATCH_SIZE]
+            for i in range(0, len(unique_shas), GRAPHQL_BATCH_SIZE)
+        ]
+        for i in range(0, len(batches), self._concurrent_requests):
+            results = await asyncio.gather(
+                *[
+                    self._client.get_text_blobs(self._owner, self._repo, batch)
+                    for batch in batches[i : i + self._concurrent_requests]
+                ],
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    logger.error(f"Could not get blobs with GraphQL: {result}")
+                    continue
+                for sha, content in result.items():
+                    if get_git_blob_sha(content) != sha:
+                        print_if_verbose(
+                            self._verbose, "blob %s differs in GraphQL", sha
+                        )
+                        continue
+                    for blob, full_path in entries_by_sha[sha]:
+                        yield blob, full_path, content
+
+    async def _get_blob_contents(
+        self,
+        blobs_and_paths: List[Tuple[GitTreeResponseModel.GitTreeObject, str]],
+        ref: Optional[str] = None,
+    ) -> AsyncGenerator[Tuple[GitTreeResponseModel.GitTreeObject, str, bytes], None]:
         """
+        Get the decoded contents of a list of blobs.
+
+        Blobs found in the cache are yielded first, without any request.
+        If `use_tarball` is set, the others are extracted from a tarball
+        of the repository. Large blobs are downloaded in parallel chunks
+        (or in one piece from the blob endpoint if that fails),
+        text blobs in batches if `use_graphql` is set,
+        and the remaining ones are downloaded concurrently.
+        Downloaded blobs are added to the cache.
+
+        :param `blobs_and_paths`: list of tuples of
+            (tree object, file's full path in the repo realtive to the root of the repo)
+        :param `ref`: commit sha the blobs belong to, required to use the tarball
+        :return: async iterator of tuples of
+            (tree object, file's full path, decoded content of the blob)
+        """
+        blobs_to_download = blobs_and_paths
+        if self._cache is not None:
+            blobs_to_download = []
+            for blob, full_path in blobs_and_paths:
+                cached_content = self._cache.get_blob(blob.sha)
+                if cached_content is None:
+                    blobs_to_download.append((blob, full_path))
+                    continue
+                print_if_verbose(self._verbose, "got %s from the cache", full_path)
+                yield blob, full_path, cached_content
+
+        if self._use_tarball and ref is not None and blobs_to_download:
+            extracted_paths = set()
+            tarball_contents = self._get_blob_contents_from_tarball(
+                blobs_to_download, ref
+            )
+            try:
+                async for blob, full_path, content in tarball_contents:
+                    if self._cache is not None:
+                        self._cache.set_blob(blob.sha, content)
+                    extracted_paths.add(full_path)
+                    yield blob, full_path, content
+            except Exception as e:
+                # the remaining blobs are downloaded one by one instead
+                logger.error(f"Could not extract the tarball of {ref}: {e}")
+            finally:
+                await tarball_contents.aclose()
+            # i.e. files excluded from archives with the export-ignore attribute,
+            # or whose content in the archive is not the blob's
+            blobs_to_download = [
+                (blob, full_path)
+                for blob, full_path in blobs_to_download
+                if full_path not in extracted_paths
+            ]
+
+        if ref is not None:
+            small_blobs = []
+            for blob, full_path in blobs_to_download:
+                if blob.size is None or blob.size <= self._large_file_threshold:
+                    small_blobs.append((blob, full_path))
+                    continue
+                try:
+                    content = await self._download_large_blob(blob, full_path, ref)
+                except Exception as e:
+                    logger.error(f"Could not download {full_path} in chunks: {e}")
+                    content = b""
+                if len(content) != blob.size:
+                    # the blob endpoint serves blobs of up to 100 MB in one piece
+                    try:
+                        content = await self._client.get_raw_blob(
+                            self._owner, self._repo, blob.sha
+                        )
+                    except Exception as e:
+                        logger.error(f"Could not download {full_path}: {e}")
+                        continue
+                if self._cache is not None:
+                    self._cache.set_blob(blob.sha, content)
+                yield blob, full_path, content
+            blobs_to_download = small_blobs
+
+        if self._use_graphql and blobs_to_download:
+            downloaded_paths = set()
+            graphql_contents = self._get_blob_contents_with_graphql(blobs_to_download)
+            try:
+                async for blob, full_path, content in graphql_contents:
+                    if self._cache is not None:
+                        self._cache.set_blob(blob.sha, content)
+                    downloaded_paths.add(full_path)
+                    yield blob, full_path, content
+            finally:
+                await graphql_contents.aclose()
+            # binary files are not available through GraphQL,
+            # and files in another encoding than utf-8 are transcoded
+            blobs_to_download = [
+                (blob, full_path)
+                for blob, full_path in blobs_to_download
+                if full_path not in downloaded_paths
+            ]
+
+        blobs_by_path = {full_path: blob for blob, full_path in blobs_to_download}
         buffered_iterator = BufferedGitBlobDataIterator(
-            blobs_and_paths=blobs_and_paths,
+            blobs_and_paths=blobs_to_download,
             github_client=self._client,
             owner=self._owner,
             repo=self._repo,
             loop=self._loop,
-            buffer_size=self._concurrent_requests,  # TODO: make this configurable
+            buffer_size=self._concurrent_requests,
             verbose=self._verbose,
         )
+        try:
+            async for content, full_path in buffered_iterator:
+                blob = blobs_by_path[full_path]
+                if self._cache is not None:
+                    self._cache.set_blob(blob.sha, content)
+                yield blob, full_path, content
+        finally:
+            await buffered_iterator.aclose()
 
-        documents = []
-        async for blob_data, full_path in buffered_iterator:
-            print_if_verbose(self._verbose, f"generating document for {full_path}")
-            assert (
-                blob_data.encoding == "base64"
-            ), f"blob encoding {blob_data.encoding} not supported"
-            decoded_bytes = None
-            try:
-                decoded_bytes = base64.b64decode(blob_data.content)
-                del blob_data.content
-            except binascii.Error:
-                print_if_verbose(
-                    self._verbose, f"could not decode {full_path} as base64"
-                )
-                continue
+    async def _generate_documents(
+        self,
+        blobs_and_paths: List[Tuple[GitTreeResponseModel.GitTreeObject, str]],
+        ref: Optional[str] = None,
+    ) -> AsyncGenerator[Document, None]:
+        """
+        Generate documents from a list of blobs and their full paths.
 
-            if self._use_parser:
-                document = self._parse_supported_file(
-                    file_path=full_path,
-                    file_content=decoded_bytes,
-                    tree_sha=blob_data.sha,
-                    tree_path=full_path,
-                )
-                if document is not None:
-                    documents.append(document)
-                else:
-                    continue
+        Files supported by a parser are parsed in the event loop thread, or
+        in a pool of worker processes (see `parser_workers`) while the next
+        blobs are being downloaded.
 
+        :param `blobs_and_paths`: list of tuples of
+            (tree object, file's full path in the repo realtive to the root of the repo)
+        :param `ref`: commit sha the blobs belong to
+        :return: async iterator of documents
+        """
+        parse_tasks: Set[asyncio.Task] = set()
+        executor: Optional[ProcessPoolExecutor] = None
+        max_parse_tasks = 2 * self._parser_workers
+        blob_contents = self._get_blob_contents(blobs_and_paths, ref)
+        with tempfile.TemporaryDirectory() as tmp_dir:
             try:
-                if decoded_bytes is None:
-                    raise ValueError("decoded_bytes is None")
-                decoded_text = decoded_bytes.decode("utf-8")
-            except UnicodeDecodeError:
-                print_if_verbose(
-                    self._verbose, f"could not decode {full_path} as utf-8"
-                )
-                continue
-            print_if_verbose(
-                self._verbose,
-                f"got {len(decoded_text)} characters"
-                + f"- adding to documents - {full_path}",
-            )
-            document = Document(
-                text=decoded_text,
-                doc_id=blob_data.sha,
-                extra_info={
-                    "file_path": full_path,
-                    "file_name": full_path.split("/")[-1],
-                },
-            )
-            documents.append(document)
-        return documents
+                async for blob, full_path, decoded_bytes in blob_contents:
+                    print_if_verbose(
+                        self._verbose, "generating document for %s", full_path
+                    )
+                    if (
+                        not self._use_parser
+                        or get_file_extension(full_path) not in DEFAULT_FILE_EXTRACTOR
+                    ):
+                        document = self._create_text_document(
+                            blob.sha, full_path, decoded_bytes
+                        )
+                        if document is not None:
+                            yield document
+                    elif self._parser_workers == 0:
+                        document = await self._parse_supported_file(
+                            file_path=full_path,
+                            file_content=decoded_bytes,
+                            tree_sha=blob.sha,
+                            tree_path=full_path,
+                            tmp_dir=tmp_dir,
+                        )
+                        if document is not None:
+                            yield document
+                    else:
+                        if executor is None:
+                            executor = ProcessPoolExecutor(self._parser_workers)
+                        parse_tasks.add(
+                            asyncio.create_task(
+                                self._parse_supported_file(
+                                    file_path=full_path,
+                                    file_content=decoded_bytes,
+                                    tree_sha=blob.sha,
+                                    tree_path=full_path,
+                                    tmp_dir=tmp_dir,
+                                    executor=executor,
+                                )
+                            )
+                        )
+                        # bound the number of files waiting to be parsed
+                        if len(parse_tasks) >= max_parse_tasks:
+                            await asyncio.wait(
+                                parse_tasks, return_when=asyncio.FIRST_COMPLETED
+                            )
 
-    def _parse_supported_file(
-        self, file_path: str, file_content: bytes, tree_sha: str, tree_path: str
+                    if parse_tasks:
+                        done = {task for task in parse_tasks if task.done()}
+                        parse_tasks -= done
+                        for task in done:
+                            parsed = task.result()
+                            if parsed is not None:
+                                yield parsed
+
+                for next_parsed in asyncio.as_completed(parse_tasks):
+                    parsed_document = await next_parsed
+                    if parsed_document is not None:
+                        yield parsed_document
+                parse_tasks.clear()
+            finally:
+                # stop the downloads and the parsing before the temporary
+                # directory is removed, i.e. when the iteration is stopped early
+                await blob_contents.aclose()
+                for task in parse_tasks:
+                    task.cancel()
+                await asyncio.gather(*parse_tasks, return_exceptions=True)
+                if executor is not None:
+                    if sys.version_info >= (3, 9):
+                        executor.shutdown(cancel_futures=True)
+                    else:
+                        executor.shutdown()
+
+    def _create_text_document(
+        self, tree_sha: str, full_path: str, decoded_bytes: bytes
+    ) -> Optional[Document]:
+        """
+        Create a document from the content of a text file.
+
+        :param `tree_sha`: sha of the blob
+        :param `full_path`: path of the file in the repo
+        :param `decoded_bytes`: content of the file
+        :return: Document, None if the content is not valid utf-8
+        """
+        # a NUL byte near the start is a cheap tell of a binary file,
+        # which spares decoding it up to the first invalid byte
+        if b"\x00" in decoded_bytes[:BINARY_SNIFF_SIZE]:
+            print_if_verbose(self._verbose, "skipping binary file %s", full_path)
+            return None
+        try:
+            decoded_text = decoded_bytes.decode("utf-8")
+        except UnicodeDecodeError:
+            print_if_verbose(self._verbose, "could not decode %s as utf-8", full_path)
+            return None
+        print_if_verbose(
+            self._verbose,
+            "got %d characters - adding to documents - %s",
+            len(decoded_text),
+            full_path,
+        )
+        return Document(
+            text=decoded_text,
+            doc_id=tree_sha,
+            extra_info={
+                "file_path": full_path,
+                "file_name": full_path.split("/")[-1],
+            },
+        )
+
+    async def _parse_supported_file(
+        self,
+        file_path: str,
+        file_content: bytes,
+        tree_sha: str,
+        tree_path: str,
+        tmp_dir: str,
+        executor: Optional[Executor] = None,
     ) -> Optional[Document]:
         """
         Parse a file if it is supported by a parser.
 
+        The parsers only accept paths, so the content is written to
+        `tmp_dir` (shared by all the files of a load) for the duration
+        of the parsing.
+
         :param `file_path`: path of the file in the repo
         :param `file_content`: content of the file
+        :param `tmp_dir`: directory to write the file to for parsing
+        :param `executor`: executor to run the parser in,
+            the parser runs in the event loop thread if not provided
         :return: Document if the file is supported by a parser, None otherwise
         """
         file_extension = get_file_extension(file_path)
         parser = DEFAULT_FILE_EXTRACTOR.get(file_extension)
-        if parser is not None:
-            parser.init_parser()
-            print_if_verbose(
-                self._verbose,
-                f"parsing {file_path}"
-                + f"as {file_extension} with "
-                + f"{parser.__class__.__name__}",
+        if parser is None:
+            return None
+
+        print_if_verbose(
+            self._verbose,
+            "parsing %s as %s with %s",
+            file_path,
+            file_extension,
+            parser.__class__.__name__,
+        )
+        fd, tmp_file = tempfile.mkstemp(suffix=file_extension, dir=tmp_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_content)
+        try:
+            if executor is None:
+                parsed_file = _parse_file(file_extension, tmp_file)
+            else:
+                parsed_file = await asyncio.get_running_loop().run_in_executor(
+                    executor, _parse_file, file_extension, tmp_file
+                )
+        except Exception as e:
+            print_if_verbose(self._verbose, "error while parsing %s", file_path)
+            logger.error(
+                "Error while parsing "
+                + f"{file_path} with "
+                + f"{parser.__class__.__name__}:\n{e}"
             )
-            with tempfile.TemporaryDirectory() as tmpdirname:
-                with tempfile.NamedTemporaryFile(
-                    dir=tmpdirname,
-                    suffix=f".{file_extension}",
-                    mode="w+b",
-                    delete=False,
-                ) as tmpfile:
-                    print_if_verbose(
-                        self._verbose,
-                        "created a temporary file"
-                        + f"{tmpfile.name} for parsing {file_path}",
-                    )
-                    tmpfile.write(file_content)
-                    tmpfile.flush()
-                    tmpfile.close()
-                    try:
-                        parsed_file = parser.parse_file(pathlib.Path(tmpfile.name))
-                        parsed_file = "\n\n".join(parsed_file)
-                    except Exception as e:
-                        print_if_verbose(
-                            self._verbose, f"error while parsing {file_path}"
-                        )
-                        logger.error(
-                            "Error while parsing "
-                            + f"{file_path} with "
-                            + f"{parser.__class__.__name__}:\n{e}"
-                        )
-                        parsed_file = None
-                    finally:
-                        os.remove(tmpfile.name)
-                    if parsed_file is None:
-                        return None
-                    return Document(
-                        text=parsed_file,
-                        doc_id=tree_sha,
-                        extra_info={
-                            "file_path": file_path,
-                            "file_name": tree_path,
-                        },
-                    )
-        return None
+            return None
+        finally:
+            os.remove(tmp_file)
+        return Document(
+            text=parsed_file,
+            doc_id=tree_sha,
+            extra_info={
+                "file_path": file_path,
+                "file_name": tree_path,
+            },
+        )
+
+
+def _parse_file(file_extension: str, file_path: str) -> str:
+    """
+    Parse a file with the default parser for its extension.
+
+    Module-level so that it can be run in a worker process.
+    The parsers are shared within a process, so each worker
+    only initializes them (i.e. loads models) once.
+    """
+    parser = DEFAULT_FILE_EXTRACTOR[file_extension]
+    if not parser.parser_config_set:
+        parser.init_parser()
+    parsed_file = parser.parse_file(pathlib.Path(file_path))
+    if isinstance(parsed_file, list):
+        return "\n\n".join(parsed_file)
+    return parsed_file
 
 
 if __name__ == "__main__":
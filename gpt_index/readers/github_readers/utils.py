@@ -4,22 +4,33 @@ Github readers utils.
 This module contains utility functions for the Github readers.
 """
 import asyncio
+import hashlib
+import logging
 import os
 import time
 from abc import ABC, abstractmethod
-from typing import List, Tuple
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
 
+from gpt_index.readers.github_readers.cache import FileCache
 from gpt_index.readers.github_readers.github_api_client import (
-    GitBlobResponseModel,
+    GitCommitResponseModel,
     GithubClient,
     GitTreeResponseModel,
 )
 
+logger = logging.getLogger(__name__)
 
-def print_if_verbose(verbose: bool, message: str) -> None:
-    """Log message if verbose is True."""
+
+def print_if_verbose(verbose: bool, message: str, *args: Any) -> None:
+    """
+    Log message if verbose is True.
+
+    The message is only formatted with `args` (printf-style) if it is printed,
+    so that the call is cheap when verbose is False.
+    """
     if verbose:
-        print(message)
+        print(message % args if args else message)
 
 
 def get_file_extension(filename: str) -> str:
@@ -27,6 +38,82 @@ def get_file_extension(filename: str) -> str:
     return f".{os.path.splitext(filename)[1][1:].lower()}"
 
 
+def get_git_blob_sha(content: bytes) -> str:
+    """Get the SHA git gives to a blob with this content."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+class GitObjectCache:
+    """
+    On-disk cache for git objects, keyed by their SHA.
+
+    Git objects are content-addressed and therefore immutable,
+    so a cached entry never has to be invalidated. Blobs are stored
+    as their decoded bytes, trees and commits as the JSON of their
+    response model.
+
+    If `max_size` is set, the least recently used objects are evicted
+    once the cached objects exceed it (reading an object marks it as used).
+    Otherwise the cache directory is never pruned.
+
+    Examples:
+        >>> cache = GitObjectCache("~/.cache/gpt_index/github", max_size=2**30)
+        >>> cache.set_blob("blob_sha", b"content")
+        >>> cache.get_blob("blob_sha")
+    """
+
+    OBJECT_TYPES = ("blobs", "trees", "recursive_trees", "commits")
+
+    def __init__(self, cache_dir: str, max_size: Optional[int] = None):
+        """
+        Initialize params.
+
+        Args:
+            - cache_dir (str): Directory to store the cached objects in.
+            - max_size (int): Maximum size (in bytes) of the cached objects,
+                unbounded if not provided.
+        """
+        self._files = FileCache(cache_dir, self.OBJECT_TYPES, max_size=max_size)
+
+    def get_blob(self, sha: str) -> Optional[bytes]:
+        """Get the decoded content of a blob, None if it is not cached."""
+        return self._files.read("blobs", sha)
+
+    def set_blob(self, sha: str, content: bytes) -> None:
+        """Cache the decoded content of a blob."""
+        self._files.write("blobs", sha, content)
+
+    def get_tree(
+        self, sha: str, recursive: bool = False
+    ) -> Optional[GitTreeResponseModel]:
+        """Get a tree, None if it is not cached."""
+        content = self._files.read("recursive_trees" if recursive else "trees", sha)
+        if content is None:
+            return None
+        return GitTreeResponseModel.from_json(content)
+
+    def set_tree(
+        self, sha: str, tree: GitTreeResponseModel, recursive: bool = False
+    ) -> None:
+        """Cache a tree (a recursive listing is cached separately)."""
+        self._files.write(
+            "recursive_trees" if recursive else "trees",
+            sha,
+            tree.to_json().encode("utf-8"),
+        )
+
+    def get_commit(self, sha: str) -> Optional[GitCommitResponseModel]:
+        """Get a commit, None if it is not cached."""
+        content = self._files.read("commits", sha)
+        if content is None:
+            return None
+        return GitCommitResponseModel.from_json(content)
+
+    def set_commit(self, sha: str, commit: GitCommitResponseModel) -> None:
+        """Cache a commit."""
+        self._files.write("commits", sha, commit.to_json().encode("utf-8"))
+
+
 class BufferedAsyncIterator(ABC):
     """
     Base class for buffered async iterators.
@@ -49,7 +136,7 @@ class BufferedAsyncIterator(ABC):
                 will result in the same behavior as a synchronous iterator.
         """
         self._buffer_size = buffer_size
-        self._buffer: List[Tuple[GitBlobResponseModel, str]] = []
+        self._buffer: List[Tuple[bytes, str]] = []
         self._index = 0
 
     @abstractmethod
@@ -60,12 +147,12 @@ class BufferedAsyncIterator(ABC):
         """Return the iterator object."""
         return self
 
-    async def __anext__(self) -> Tuple[GitBlobResponseModel, str]:
+    async def __anext__(self) -> Tuple[bytes, str]:
         """
         Get next item.
 
         Returns:
-            - `item (Tuple[GitBlobResponseModel, str])`: Next item.
+            - `item (Tuple[bytes, str])`: Next item.
 
         Raises:
             - `StopAsyncIteration`: If there are no more items.
@@ -93,6 +180,13 @@ class BufferedGitBlobDataIterator(BufferedAsyncIterator):
     Otherwise you would have to retrieve all the contents of
     the files in the repository at once, which would
     be problematic if the repository is large.
+
+    Requests are kept in a sliding window: as soon as any request completes,
+    the request for the next blob is scheduled, so there are always up to
+    `buffer_size` requests in flight instead of waiting for a whole batch
+    (or for the oldest request) to complete before starting the next one.
+    The blobs are still handed out in order, so up to `2 * buffer_size`
+    downloaded blobs may be held while waiting for a slower one.
     """
 
     def __init__(
@@ -115,7 +209,7 @@ class BufferedGitBlobDataIterator(BufferedAsyncIterator):
             - owner (str): Owner of the repository.
             - repo (str): Name of the repository.
             - loop (asyncio.AbstractEventLoop): Event loop.
-            - buffer_size (int): Size of the buffer.
+            - buffer_size (int): Maximum number of concurrent get_blob requests.
         """
         super().__init__(buffer_size)
         self._blobs_and_paths = blobs_and_paths
@@ -127,44 +221,73 @@ class BufferedGitBlobDataIterator(BufferedAsyncIterator):
             loop = asyncio.get_event_loop()
             if loop is None:
                 raise ValueError("No event loop found")
+        self._loop = loop
+        self._next_index = 0
+        self._in_flight = 0
+        self._pending: Deque[Tuple[asyncio.Future, str]] = deque()
 
-    async def _fill_buffer(self) -> None:
-        """
-        Fill the buffer with the results of the get_blob operation.
-
-        The get_blob operation is called for each blob in the blobs_and_paths list.
-        The blobs are retrieved in batches of size buffer_size.
-        """
-        del self._buffer[:]
-        self._buffer = []
-        start = self._index
-        end = min(start + self._buffer_size, len(self._blobs_and_paths))
-
-        if start >= end:
-            return
-
+    async def _get_blob(self, blob: GitTreeResponseModel.GitTreeObject) -> bytes:
+        """Get a blob, reporting the time taken if verbose."""
         if self._verbose:
             start_t = time.time()
-        results: List[GitBlobResponseModel] = await asyncio.gather(
-            *[
-                self._github_client.get_blob(self._owner, self._repo, blob.sha)
-                for blob, _ in self._blobs_and_paths[
-                    start:end
-                ]  # TODO: use batch_size instead of buffer_size for concurrent requests
-            ]
+        result = await self._github_client.get_raw_blob(
+            self._owner, self._repo, blob.sha
         )
         if self._verbose:
             end_t = time.time()
-            blob_names_and_sizes = [
-                (blob.path, blob.size) for blob, _ in self._blobs_and_paths[start:end]
-            ]
             print(
-                "Time to get blobs ("
-                + f"{blob_names_and_sizes}"
-                + f"): {end_t - start_t:.2f} seconds"
+                f"Time to get blob ({blob.path}, {blob.size}): "
+                + f"{end_t - start_t:.2f} seconds"
             )
+        return result
+
+    def _schedule_requests(self) -> None:
+        """Schedule get_blob requests until the window is full."""
+        while (
+            self._in_flight < self._buffer_size
+            and len(self._pending) < 2 * self._buffer_size
+            and self._next_index < len(self._blobs_and_paths)
+        ):
+            blob, path = self._blobs_and_paths[self._next_index]
+            task = self._loop.create_task(self._get_blob(blob))
+            task.add_done_callback(self._on_request_done)
+            self._pending.append((task, path))
+            self._in_flight += 1
+            self._next_index += 1
 
-        self._buffer = [
-            (result, path)
-            for result, (_, path) in zip(results, self._blobs_and_paths[start:end])
-        ]
+    def _on_request_done(self, task: asyncio.Future) -> None:
+        """Schedule the next request as soon as any request completes."""
+        self._in_flight -= 1
+        self._schedule_requests()
+
+    async def aclose(self) -> None:
+        """Cancel the pending requests, i.e. when the iteration is stopped early."""
+        self._next_index = len(self._blobs_and_paths)
+        tasks = [task for task, _ in self._pending]
+        self._pending.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _fill_buffer(self) -> None:
+        """
+        Fill the buffer with the result of the next get_blob operation.
+
+        Blobs are yielded in the same order as blobs_and_paths.
+        A blob that could not be retrieved is reported and skipped
+        instead of aborting the whole iteration.
+        """
+        del self._buffer[:]
+        self._schedule_requests()
+        while self._pending:
+            task, path = self._pending.popleft()
+            try:
+                result = await task
+            except Exception as e:
+                logger.error(f"Could not get blob for {path}: {e}")
+                continue
+            finally:
+                # a slot of the look-ahead was freed
+                self._schedule_requests()
+            self._buffer.append((result, path))
+            return
@@ -0,0 +1,539 @@
+"""Test Github repository reader."""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import pytest
+
+from gpt_index.readers.github_readers.github_api_client import GithubClient
+from gpt_index.readers.github_readers.github_repository_reader import (
+    GithubRepositoryReader,
+)
+from gpt_index.readers.github_readers.utils import GitObjectCache, get_git_blob_sha
+
+OWNER = "owner"
+REPO = "repo"
+BRANCH = "main"
+COMMIT_SHA = "c" * 40
+
+FILES = {
+    "README.txt": b"readme",
+    "src/main.py": b"print('hello')",
+    "src/utils/helpers.py": b"def helper(): ...",
+    "docs/index.txt": b"docs",
+    "docs/api/reference.txt": b"reference",
+    "docs_old/notes.txt": b"old notes",
+    "bin.dat": b"ab\x00cd",
+}
+
+
+def _sha(content: bytes) -> str:
+    """Get a fake SHA for a tree."""
+    return hashlib.sha1(content).hexdigest()
+
+
+class FakeGithub:
+    """Fake Github API serving a repository from a dict of paths to contents."""
+
+    def __init__(self, files: Dict[str, bytes]):
+        """Init params."""
+        self.files = files
+        self.requests: List[httpx.Request] = []
+        self.truncated = False
+        self.broken_tarball = False
+        self.ignore_ranges = False
+        self.short_ranges = False
+        self.raw_status: Optional[int] = None
+        # paths of the files GraphQL truncates
+        self.graphql_truncated: List[str] = []
+        # content of the files in the tarball, if it differs
+        self.tarball_files: Dict[str, bytes] = {}
+        self.blobs = {get_git_blob_sha(content): content for content in files.values()}
+        # directory path (the root is "") by tree sha
+        directories = {""}
+        for path in files:
+            parts = path.split("/")
+            directories.update("/".join(parts[:i]) for i in range(1, len(parts)))
+        self.trees = {_sha(f"tree:{path}".encode()): path for path in directories}
+        self.root_tree_sha = _sha(b"tree:")
+
+    def _tree_entry(self, path: str, name: str) -> Dict[str, Any]:
+        """Get the tree entry of a file or a directory."""
+        if path in self.files:
+            return {
+                "path": name,
+                "mode": "100644",
+                "type": "blob",
+                "sha": get_git_blob_sha(self.files[path]),
+                "url": "",
+                "size": len(self.files[path]),
+            }
+        return {
+            "path": name,
+            "mode": "040000",
+            "type": "tree",
+            "sha": _sha(f"tree:{path}".encode()),
+            "url": "",
+        }
+
+    def _get_tree(self, tree_sha: str, recursive: bool) -> Dict[str, Any]:
+        """List a directory, or all the files and directories under it."""
+        directory = self.trees[tree_sha]
+        prefix = f"{directory}/" if directory else ""
+        paths = sorted(
+            {
+                path
+                for path in list(self.files) + list(self.trees.values())
+                if path.startswith(prefix) and path != directory
+            }
+        )
+        if not recursive:
+            paths = [path for path in paths if "/" not in path[len(prefix) :]]
+        return {
+            "sha": tree_sha,
+            "url": "",
+            "tree": [self._tree_entry(path, path[len(prefix) :]) for path in paths],
+            "truncated": recursive and self.truncated,
+        }
+
+    def _get_tarball(self) -> bytes:
+        """Archive the repository in a top-level directory, as Github does."""
+        if self.broken_tarball:
+            return b"not a tarball"
+        tarball = io.BytesIO()
+        with tarfile.open(fileobj=tarball, mode="w:gz") as tar:
+            for path, content in {**self.files, **self.tarball_files}.items():
+                info = tarfile.TarInfo(f"{OWNER}-{REPO}-{COMMIT_SHA[:7]}/{path}")
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        return tarball.getvalue()
+
+    def _get_raw_file(self, request: httpx.Request, path: str) -> httpx.Response:
+        """Serve a file, or the byte range of a file."""
+        if self.raw_status is not None:
+            return httpx.Response(self.raw_status)
+        content = self.files[path]
+        byte_range = request.headers.get("Range")
+        if byte_range is None or self.ignore_ranges:
+            return httpx.Response(200, content=content)
+        start, end = byte_range[len("bytes=") :].split("-")
+        if self.short_ranges:
+            return httpx.Response(206, content=content[int(start) : int(end)])
+        return httpx.Response(206, content=content[int(start) : int(end) + 1])
+
+    def _query_graphql(self, request: httpx.Request) -> httpx.Response:
+        """Answer a query for blobs, as Github does for text and binary blobs."""
+        variables = json.loads(request.content)["variables"]
+        paths_by_sha = {
+            get_git_blob_sha(content): path for path, content in self.files.items()
+        }
+        repository = {}
+        for name, sha in variables.items():
+            if not name.startswith("oid"):
+                continue
+            content = self.blobs[sha]
+            is_binary = b"\x00" in content
+            repository[f"b{name[len('oid') :]}"] = {
+                "oid": sha,
+                # text in another encoding than utf-8 is transcoded
+                "text": None
+                if is_binary
+                else content.decode("utf-8", errors="replace"),
+                "isBinary": is_binary,
+                "isTruncated": paths_by_sha[sha] in self.graphql_truncated,
+            }
+        return httpx.Response(200, json={"data": {"repository": repository}})
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Handle a request to the API."""
+        self.requests.append(request)
+        path = request.url.path
+        if request.url.host == "raw.githubusercontent.com":
+            prefix = f"/{OWNER}/{REPO}/{COMMIT_SHA}/"
+            return self._get_raw_file(request, path[len(prefix) :])
+
+        if path == "/graphql":
+            return self._query_graphql(request)
+
+        repo_prefix = f"/repos/{OWNER}/{REPO}"
+        path = path[len(repo_prefix) :]
+        commit = {"sha": COMMIT_SHA, "commit": {"tree": {"sha": self.root_tree_sha}}}
+        if path == f"/branches/{BRANCH}":
+            return httpx.Response(200, json={"commit": commit})
+        if path == f"/commits/{COMMIT_SHA}":
+            return httpx.Response(200, json=commit)
+        if path.startswith("/git/trees/"):
+            tree_sha = path[len("/git/trees/") :]
+            recursive = "recursive" in request.url.params
+            return httpx.Response(200, json=self._get_tree(tree_sha, recursive))
+        if path.startswith("/git/blobs/"):
+            return httpx.Response(200, content=self.blobs[path[len("/git/blobs/") :]])
+        if path == f"/tarball/{COMMIT_SHA}":
+            return httpx.Response(200, content=self._get_tarball())
+        return httpx.Response(404)
+
+
+def _mock_transport(
+    monkeypatch: pytest.MonkeyPatch,
+    handler: Callable[[httpx.Request], Any],
+) -> None:
+    """Route the requests of the Github clients to a handler."""
+    async_client = httpx.AsyncClient
+
+    def mock_async_client(**kwargs: Any) -> httpx.AsyncClient:
+        return async_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    monkeypatch.setattr(httpx, "AsyncClient", mock_async_client)
+
+
+@pytest.fixture
+def github(monkeypatch: pytest.MonkeyPatch) -> FakeGithub:
+    """Route the requests of the Github clients to a fake Github."""
+    fake_github = FakeGithub(FILES)
+    _mock_transport(monkeypatch, fake_github.handle)
+    return fake_github
+
+
+def _load(**kwargs: Any) -> Dict[str, Optional[str]]:
+    """Load the fake repository, return the text of the documents by path."""
+    with GithubRepositoryReader(
+        OWNER, REPO, github_token="token", use_parser=False, **kwargs
+    ) as reader:
+        documents = reader.load_data(commit_sha=COMMIT_SHA)
+    return {
+        document.extra_info["file_path"]: document.text
+        for document in documents
+        if document.extra_info is not None
+    }
+
+
+def _expected(paths: Optional[List[str]] = None) -> Dict[str, str]:
+    """Get the expected text of the documents by path (binary files are skipped)."""
+    return {
+        path: content.decode("utf-8")
+        for path, content in FILES.items()
+        if (paths is None or path in paths) and b"\x00" not in content
+    }
+
+
+def test_load_data(github: FakeGithub) -> None:
+    """Test loading the files of a commit and of a branch."""
+    assert _load() == _expected()
+    with GithubRepositoryReader(
+        OWNER, REPO, github_token="token", use_parser=False
+    ) as reader:
+        documents = reader.load_data(branch=BRANCH)
+    # in the order of the files in the repository
+    assert [
+        (document.extra_info["file_path"], document.text)
+        for document in documents
+        if document.extra_info is not None
+    ] == sorted(_expected().items())
+
+
+def test_lazy_load_data_stopped_early(github: FakeGithub) -> None:
+    """Test that no download is left pending when the iteration is stopped."""
+    with GithubRepositoryReader(
+        OWNER, REPO, github_token="token", use_parser=False, concurrent_requests=2
+    ) as reader:
+        documents = reader.lazy_load_data(commit_sha=COMMIT_SHA)
+        next(documents)
+        documents.close()
+        assert asyncio.all_tasks(reader._loop) == set()
+
+
+def test_binary_files(github: FakeGithub) -> None:
+    """Test that binary files are not loaded, even if they are valid utf-8."""
+    assert "bin.dat" not in _load()
+    assert FILES["bin.dat"].decode("utf-8")
+
+
+def test_cache(github: FakeGithub, tmp_path: Any) -> None:
+    """Test that a cached commit is loaded again without any request."""
+    assert _load(cache_dir=str(tmp_path)) == _expected()
+    github.requests.clear()
+    assert _load(cache_dir=str(tmp_path)) == _expected()
+    assert github.requests == []
+
+
+def test_cache_eviction(tmp_path: Any) -> None:
+    """Test that the least recently used objects are evicted."""
+    cache = GitObjectCache(str(tmp_path), max_size=250)
+    for i in range(3):
+        cache.set_blob(f"blob{i}", b"x" * 100)
+        os.utime(os.path.join(str(tmp_path), "blobs", "bl", f"blob{i}"), (i, i))
+    assert cache.get_blob("blob0") is None
+    # reading an object marks it as recently used
+    assert cache.get_blob("blob1") is not None
+    cache.set_blob("blob3", b"x" * 100)
+    assert cache.get_blob("blob1") is not None
+    assert cache.get_blob("blob2") is None
+    assert cache.get_blob("blob3") is not None
+
+
+def test_ignore_directories(github: FakeGithub) -> None:
+    """Test that the files under an ignored directory are not loaded."""
+    expected = _expected(["README.txt", "src/main.py", "docs_old/notes.txt"])
+    # "docs" does not ignore "docs_old"
+    assert _load(ignore_directories=["docs", "src/utils"]) == expected
+    github.truncated = True
+    assert _load(ignore_directories=["docs", "src/utils"]) == expected
+    assert not any(
+        request.url.path.endswith("/" + _sha(b"tree:docs"))
+        for request in github.requests
+    )
+
+
+def test_filters(github: FakeGithub) -> None:
+    """Test that the filtered out files are not downloaded."""
+    python_files = _expected(["src/main.py", "src/utils/helpers.py"])
+    assert _load(include_file_extensions=[".py"]) == python_files
+    assert _load(ignore_file_extensions=[".txt"]) == python_files
+    assert _load(max_file_size=6) == _expected(["README.txt", "docs/index.txt"])
+    blob_requests = [
+        request for request in github.requests if "/git/blobs/" in request.url.path
+    ]
+    # "bin.dat" is neither a ".txt" file nor larger than 6 bytes
+    assert len(blob_requests) == 2 + 3 + 3
+
+
+def test_truncated_tree(github: FakeGithub) -> None:
+    """Test that a truncated recursive tree is walked one directory at a time."""
+    github.truncated = True
+    assert _load() == _expected()
+    tree_requests = [
+        request for request in github.requests if "/git/trees/" in request.url.path
+    ]
+    # the recursive listing, then one request per directory
+    assert len(tree_requests) == 1 + len(github.trees)
+
+
+def test_tarball(github: FakeGithub) -> None:
+    """Test extracting the files from a tarball of the repository."""
+    assert _load(use_tarball=True) == _expected()
+    assert not any("/git/blobs/" in request.url.path for request in github.requests)
+
+
+def test_broken_tarball(github: FakeGithub) -> None:
+    """Test that the files are downloaded one by one if the tarball is broken."""
+    github.broken_tarball = True
+    assert _load(use_tarball=True) == _expected()
+    blob_requests = [
+        request for request in github.requests if "/git/blobs/" in request.url.path
+    ]
+    assert len(blob_requests) == len(FILES)
+
+
+def test_tarball_changed_file(github: FakeGithub) -> None:
+    """Test that a file whose content differs in the tarball is downloaded."""
+    github.tarball_files["README.txt"] = b"readme\r\n"
+    assert _load(use_tarball=True) == _expected()
+    blob_requests = [
+        request for request in github.requests if "/git/blobs/" in request.url.path
+    ]
+    assert [request.url.path for request in blob_requests] == [
+        f"/repos/{OWNER}/{REPO}/git/blobs/{get_git_blob_sha(FILES['README.txt'])}"
+    ]
+
+
+def test_graphql(monkeypatch: pytest.MonkeyPatch, tmp_path: Any) -> None:
+    """Test downloading the text files with GraphQL."""
+    github = FakeGithub(
+        {**FILES, "latin1.txt": b"caf\xe9", "image.png": b"\x89PNG\x00"}
+    )
+    github.graphql_truncated.append("README.txt")
+    _mock_transport(monkeypatch, github.handle)
+
+    # neither the latin-1 file nor the binary file is valid utf-8 text
+    assert _load(use_graphql=True, cache_dir=str(tmp_path)) == _expected()
+    assert any(request.url.path == "/graphql" for request in github.requests)
+    # the truncated, binary and transcoded blobs are downloaded one by one
+    blob_requests = {
+        request.url.path.rpartition("/")[2]
+        for request in github.requests
+        if "/git/blobs/" in request.url.path
+    }
+    assert blob_requests == {
+        get_git_blob_sha(github.files[path])
+        for path in ["README.txt", "latin1.txt", "image.png", "bin.dat"]
+    }
+    # the cache only holds the blobs' own content
+    cache = GitObjectCache(str(tmp_path))
+    for content in github.files.values():
+        assert cache.get_blob(get_git_blob_sha(content)) == content
+
+
+def test_get_text_blobs(github: FakeGithub) -> None:
+    """Test that the blobs of a GraphQL query are mapped back to their SHA."""
+    shas = [get_git_blob_sha(content) for content in FILES.values()]
+
+    async def get_text_blobs() -> Dict[str, bytes]:
+        async with GithubClient("token") as client:
+            return await client.get_text_blobs(OWNER, REPO, shas)
+
+    # binary blobs are left out
+    assert asyncio.run(get_text_blobs()) == {
+        sha: content
+        for sha, content in zip(shas, FILES.values())
+        if b"\x00" not in content
+    }
+
+
+def test_large_files(github: FakeGithub) -> None:
+    """Test downloading the large files as several byte ranges."""
+    assert _load(large_file_threshold=5) == _expected()
+    raw_requests = [
+        request
+        for request in github.requests
+        if request.url.host == "raw.githubusercontent.com"
+    ]
+    # one range per 5 bytes, at least 2, for the files larger than 5 bytes
+    assert len(raw_requests) == sum(
+        max(2, len(content) // 5) for content in FILES.values() if len(content) > 5
+    )
+    assert all("Range" in request.headers for request in raw_requests)
+
+    assert all(
+        request.headers["Accept-Encoding"] == "identity" for request in raw_requests
+    )
+
+    # a server ignoring the ranges answers with the whole file
+    github.ignore_ranges = True
+    assert _load(large_file_threshold=5) == _expected()
+
+
+def test_large_files_fallback(github: FakeGithub, tmp_path: Any) -> None:
+    """Test that the blob endpoint is used if the byte ranges are wrong."""
+    github.short_ranges = True
+    assert _load(large_file_threshold=5, cache_dir=str(tmp_path)) == _expected()
+    # the truncated content was not cached either
+    assert _load(cache_dir=str(tmp_path)) == _expected()
+
+    github.short_ranges = False
+    github.raw_status = 404
+    assert _load(large_file_threshold=5) == _expected()
+
+
+def test_conditional_requests(monkeypatch: pytest.MonkeyPatch, tmp_path: Any) -> None:
+    """Test that an unchanged branch is replayed from the cache on a 304."""
+    branch = {"commit": {"sha": COMMIT_SHA, "commit": {"tree": {"sha": "tree"}}}}
+    requests = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"etag"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=branch, headers={"ETag": '"etag"'})
+
+    _mock_transport(monkeypatch, handle)
+
+    async def get_branch_twice() -> List[Any]:
+        async with GithubClient("token", cache_dir=str(tmp_path)) as client:
+            return [await client.get_branch(OWNER, REPO, BRANCH) for _ in range(2)]
+
+    first, second = asyncio.run(get_branch_twice())
+    assert first == second
+    assert first.commit.sha == COMMIT_SHA
+    assert "If-None-Match" not in requests[0].headers
+    assert requests[1].headers["If-None-Match"] == '"etag"'
+
+
+def _request_branch(client: GithubClient) -> Any:
+    """Request a branch, return the response whatever its status."""
+    return client.request("getBranch", "GET", owner=OWNER, repo=REPO, branch=BRANCH)
+
+
+@pytest.fixture
+def sleeps(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    """Record the delays waited for, without waiting."""
+    delays: List[float] = []
+    sleep = asyncio.sleep
+
+    async def mock_sleep(delay: float) -> None:
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", mock_sleep)
+    return delays
+
+
+def test_retries(monkeypatch: pytest.MonkeyPatch, sleeps: List[float]) -> None:
+    """Test that rate limited and failed requests are retried."""
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "3"}),
+        httpx.Response(502),
+        httpx.Response(200, json={}),
+        httpx.Response(403),
+    ]
+    _mock_transport(monkeypatch, lambda request: responses.pop(0))
+
+    async def request_twice() -> List[int]:
+        async with GithubClient("token") as client:
+            return [(await _request_branch(client)).status_code for _ in range(2)]
+
+    # a 403 without rate limit headers is not retried
+    assert asyncio.run(request_twice()) == [200, 403]
+    assert sleeps[0] == 3
+    # exponential backoff with jitter
+    assert 2 <= sleeps[1] < 3
+    assert len(sleeps) == 2
+
+
+def test_max_retries(monkeypatch: pytest.MonkeyPatch, sleeps: List[float]) -> None:
+    """Test that the last response is returned once the retries are exhausted."""
+    _mock_transport(monkeypatch, lambda request: httpx.Response(503))
+
+    async def request() -> int:
+        async with GithubClient("token", max_retries=2) as client:
+            return (await _request_branch(client)).status_code
+
+    assert asyncio.run(request()) == 503
+    assert len(sleeps) == 2
+
+
+def test_rate_limit_reset(monkeypatch: pytest.MonkeyPatch, sleeps: List[float]) -> None:
+    """Test that the requests wait for an exhausted rate limit to reset."""
+    reset = time.time() + 100
+    headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)}
+    _mock_transport(
+        monkeypatch, lambda request: httpx.Response(200, json={}, headers=headers)
+    )
+
+    async def request_twice() -> None:
+        async with GithubClient("token") as client:
+            for _ in range(2):
+                await _request_branch(client)
+
+    asyncio.run(request_twice())
+    assert len(sleeps) == 1
+    assert sleeps[0] == pytest.approx(100, abs=5)
+
+
+def test_max_concurrent_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the number of requests in flight is bounded."""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={})
+
+    _mock_transport(monkeypatch, handle)
+
+    async def request_all() -> None:
+        async with GithubClient("token", max_concurrent_requests=3) as client:
+            await asyncio.gather(*[_request_branch(client) for _ in range(10)])
+
+    asyncio.run(request_all())
+    assert max_in_flight == 3